@@ -1007,13 +1007,10 @@ class XmlManifest(object):
     fromProjects = self.paths
     toProjects = manifest.paths
 
-    fromKeys = sorted(fromProjects.keys())
-    toKeys = sorted(toProjects.keys())
-
     diff = {'added': [], 'removed': [], 'changed': [], 'unreachable': []}
 
-    for proj in fromKeys:
-      if not proj in toKeys:
+    for proj in sorted(fromProjects.keys()):
+      if proj not in toProjects:
         diff['removed'].append(fromProjects[proj])
       else:
         fromProj = fromProjects[proj]
@@ -1026,10 +1023,10 @@ class XmlManifest(object):
         else:
           if fromRevId != toRevId:
             diff['changed'].append((fromProj, toProj))
-        toKeys.remove(proj)
 
-    for proj in toKeys:
-      diff['added'].append(toProjects[proj])
+    for proj in sorted(toProjects.keys()):
+      if proj not in fromProjects:
+        diff['added'].append(toProjects[proj])
 
     return diff
 
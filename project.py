@@ -87,6 +87,24 @@ def not_rev(r):
 def sq(r):
   return "'" + r.replace("'", "'\''") + "'"
 
+
+def _ConfigArgs(name, config):
+  """Turn a dict of git config options into '-c' command line arguments.
+
+  Args:
+    name: The git command the options are passed to, for error messages.
+    config: An optional dict of git config options.
+  """
+  args = []
+  if config is not None:
+    if not git_require((1, 7, 2)):
+      raise ValueError('cannot set config on command line for %s()' % name)
+    for k, v in config.items():
+      args.append('-c')
+      args.append('%s=%s' % (k, v))
+  return args
+
+
 _project_hook_list = None
 
 
@@ -2823,47 +2841,107 @@ class Project(object):
   def _allrefs(self):
     return self.bare_ref.all
 
-  def _getLogs(self, rev1, rev2, oneline=False, color=True, pretty_format=None):
-    """Get logs between two revisions of this project."""
+  def _logArgs(self, rev1, rev2, oneline=False, color=True, pretty_format=None,
+               max_count=None):
+    """Build the `git log` arguments between two revisions of this project.
+
+    Returns None if there is no starting revision.
+    """
     comp = '..'
-    if rev1:
-      revs = [rev1]
-      if rev2:
-        revs.extend([comp, rev2])
-      cmd = ['log', ''.join(revs)]
-      out = DiffColoring(self.config)
-      if out.is_on and color:
-        cmd.append('--color')
-      if pretty_format is not None:
-        cmd.append('--pretty=format:%s' % pretty_format)
-      if oneline:
-        cmd.append('--oneline')
+    if not rev1:
+      return None
+    revs = [rev1]
+    if rev2:
+      revs.extend([comp, rev2])
+    # Ref names change over time, keep them out even if log.decorate is set.
+    args = [''.join(revs), '--no-decorate']
+    out = DiffColoring(self.config)
+    if out.is_on and color:
+      args.append('--color')
+    if pretty_format is not None:
+      args.append('--pretty=format:%s' % pretty_format)
+    if oneline:
+      args.append('--oneline')
+    if max_count is not None:
+      args.append('--max-count=%d' % max_count)
+    return args
+
+  def _iterLogs(self, rev1, rev2, oneline=False, color=True, pretty_format=None,
+                config=None, max_count=None, bare=False):
+    """Yield the log lines between two revisions of this project.
+
+    Lines are yielded as git produces them instead of being buffered.
 
-      try:
-        log = GitCommand(self, cmd, capture_stdout=True, capture_stderr=True)
-        if log.Wait() == 0:
-          return log.stdout
-      except GitError:
-        # worktree may not exist if groups changed for example. In that case,
-        # try in gitdir instead.
-        if not os.path.exists(self.worktree):
-          return self.bare_git.log(*cmd[1:])
-        else:
-          raise
-    return None
+    Args:
+      config: An optional dict of git config options to be passed with '-c'.
+      bare: Run git in the gitdir instead of the worktree.
+    """
+    args = self._logArgs(rev1, rev2, oneline=oneline, color=color,
+                         pretty_format=pretty_format, max_count=max_count)
+    if args is None:
+      return
 
-  def getAddedAndRemovedLogs(self, toProject, oneline=False, color=True,
-                             pretty_format=None):
-    """Get the list of logs from this revision to given revisionId"""
-    logs = {}
+    p = GitCommand(self,
+                   _ConfigArgs('log', config) + ['log'] + args,
+                   bare=bare,
+                   capture_stdout=True,
+                   capture_stderr=True)
+    for line in p.process.stdout:
+      if not hasattr(line, 'encode'):
+        line = line.decode()
+      yield line.rstrip('\r\n')
+    if p.Wait() != 0 and bare:
+      raise GitError('%s log: %s' % (self.name, p.stderr))
+
+  def iterAddedAndRemovedLogs(self, toProject, oneline=False, color=True,
+                              pretty_format=None, config=None, max_count=None):
+    """Iterate over the logs from this revision to given revisionId.
+
+    Yields ('R', line) for every removed log line, then ('A', line) for every
+    added log line, streaming them from git.  If max_count is given, at most
+    that many commits are logged on each side.
+    """
+    selfId = self.GetRevisionId(self._allrefs)
+    toId = toProject.GetRevisionId(toProject._allrefs)
+    # worktree may not exist if groups changed for example. In that case,
+    # use gitdir instead.
+    bare = not os.path.exists(self.worktree)
+
+    for log in self._iterLogs(toId, selfId, oneline=oneline, color=color,
+                              pretty_format=pretty_format, config=config,
+                              max_count=max_count, bare=bare):
+      yield 'R', log
+    for log in self._iterLogs(selfId, toId, oneline=oneline, color=color,
+                              pretty_format=pretty_format, config=config,
+                              max_count=max_count, bare=bare):
+      yield 'A', log
+
+  def verifyRevisions(self, toProject):
+    """Check that this revision and toProject's are available locally.
+
+    Raises:
+      GitError: A revision is not available locally.
+    """
+    selfId = self.GetRevisionId(self._allrefs)
+    toId = toProject.GetRevisionId(toProject._allrefs)
+    self.bare_git.rev_list('--no-walk', selfId, toId)
+
+  def countAddedAndRemovedLogs(self, toProject):
+    """Count the commits added and removed up to toProject's revision.
+
+    Returns:
+      An (added, removed) tuple.
+
+    Raises:
+      GitError: A revision is not available locally.
+    """
     selfId = self.GetRevisionId(self._allrefs)
     toId = toProject.GetRevisionId(toProject._allrefs)
 
-    logs['added'] = self._getLogs(selfId, toId, oneline=oneline, color=color,
-                                  pretty_format=pretty_format)
-    logs['removed'] = self._getLogs(toId, selfId, oneline=oneline, color=color,
-                                    pretty_format=pretty_format)
-    return logs
+    counts = self.bare_git.rev_list('--left-right', '--count',
+                                    '%s...%s' % (selfId, toId))
+    removed, added = counts[0].split()
+    return int(added), int(removed)
 
   class _GitGetByExec(object):
 
@@ -3039,18 +3117,11 @@ class Project(object):
       name = name.replace('_', '-')
 
       def runner(*args, **kwargs):
-        cmdv = []
         config = kwargs.pop('config', None)
         for k in kwargs:
           raise TypeError('%s() got an unexpected keyword argument %r'
                           % (name, k))
-        if config is not None:
-          if not git_require((1, 7, 2)):
-            raise ValueError('cannot set config on command line for %s()'
-                             % name)
-          for k, v in config.items():
-            cmdv.append('-c')
-            cmdv.append('%s=%s' % (k, v))
+        cmdv = _ConfigArgs(name, config)
         cmdv.append(name)
         cmdv.extend(args)
         p = GitCommand(self._project,
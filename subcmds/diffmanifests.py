@@ -14,16 +14,159 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
+import json
 import os.path
+import re
+import sys
+import tempfile
+import time
+
+from pyversion import is_python3
+if is_python3():
+  from io import StringIO
+else:
+  from StringIO import StringIO
+
+try:
+  import threading as _threading
+except ImportError:
+  import dummy_threading as _threading
+
+try:
+  import multiprocessing
+except ImportError:
+  multiprocessing = None
+
 from color import Coloring
 from command import PagedCommand
-from git_config import IsId
+from error import GitError
+from git_command import git_require
+from git_config import ID_RE
 from manifest_xml import (XmlManifest, MANIFEST_FILE_NAME)
+import platform_utils
+from project import DiffColoring
+
+# Make sure `git log` walks history through the commit-graph when there is one.
+_LOG_CONFIG = {'core.commitGraph': 'true'}
+
+# Only the first _LIMIT_LINES logs of a project are shown when it has more than
+# _MAX_LINES of them.
+_LIMIT_LINES = 10
+_MAX_LINES = _LIMIT_LINES + _LIMIT_LINES // 2
+
+# Commit status prefixes of the raw output.
+_RAW_ADDED = ' A '
+_RAW_REMOVED = ' R '
+
+_ONE_WEEK_S = 7 * 24 * 60 * 60
+
+# Pretty format placeholders whose output changes over time: dates that may be
+# relative, ref names, signature checks and descriptions from tags.
+_VOLATILE_FORMAT_RE = re.compile(r'%([ac][rdh]|[dD]|G|\(describe)')
 
 class _Coloring(Coloring):
   def __init__(self, config):
     Coloring.__init__(self, config, "status")
 
+class _LogCache(object):
+  """Logs of changed projects, kept across runs.
+
+  Commits never change, so the logs between two commits can be reused as long
+  as they are formatted the same way, and the format does not show anything
+  that changes over time, such as relative dates or ref names.  Entries
+  expire after a week.
+  """
+
+  def __init__(self, manifest):
+    self._path = os.path.join(manifest.repodir, '.repo_diffmanifests.json')
+    self._logs = None
+    self._dirty = False
+    # Load right away, Get() and Set() are called from several threads.
+    self._Load()
+
+  def Key(self, project, otherProject, color, pretty_format):
+    """Return the key of the logs in the cache, or None to not cache them."""
+    if pretty_format is not None:
+      if _VOLATILE_FORMAT_RE.search(pretty_format.replace('%%', '')):
+        return None
+    color = color and DiffColoring(project.config).is_on
+    return '|'.join((project.gitdir,
+                     project.GetCommitRevisionId(),
+                     otherProject.GetCommitRevisionId(),
+                     str(color),
+                     str(pretty_format)))
+
+  def Get(self, key):
+    if key is None:
+      return None
+    entry = self._logs.get(key)
+    if entry is None:
+      return None
+    return {'added': entry['added'], 'removed': entry['removed']}
+
+  def Set(self, key, logs):
+    if key is None:
+      return
+    self._logs[key] = {'added': logs['added'],
+                       'removed': logs['removed'],
+                       'time': time.time()}
+    self._dirty = True
+
+  def _Load(self):
+    if self._logs is None:
+      try:
+        f = open(self._path)
+        try:
+          self._logs = json.load(f)
+        finally:
+          f.close()
+      except (IOError, ValueError):
+        try:
+          platform_utils.remove(self._path)
+        except OSError:
+          pass
+        self._logs = {}
+
+      valid = isinstance(self._logs, dict) and all(
+          self._IsValid(v) for v in self._logs.values())
+      if not valid:
+        # Start over rather than trip on the cache later on.
+        self._logs = {}
+        self._dirty = True
+
+      expired = time.time() - _ONE_WEEK_S
+      for key in [k for k, v in self._logs.items() if v['time'] < expired]:
+        del self._logs[key]
+        self._dirty = True
+
+  @staticmethod
+  def _IsValid(entry):
+    """Whether |entry| has the shape Set() stores."""
+    try:
+      for total, lines in (entry['added'], entry['removed']):
+        if not isinstance(total, int) or not isinstance(lines, list):
+          return False
+      return isinstance(entry['time'], (int, float))
+    except (KeyError, TypeError, ValueError):
+      return False
+
+  def Save(self):
+    if not self._dirty:
+      return
+
+    try:
+      f = open(self._path, 'w')
+      try:
+        json.dump(self._logs, f)
+      finally:
+        f.close()
+    except (IOError, TypeError):
+      try:
+        platform_utils.remove(self._path)
+      except OSError:
+        pass
+
 class Diffmanifests(PagedCommand):
   """ A command to see logs in projects represented by manifests
 
@@ -68,6 +211,13 @@ synced and their revisions won't be found.
 """
 
   def _Options(self, p):
+    jobs = 1
+    if multiprocessing:
+      try:
+        jobs = min(32, multiprocessing.cpu_count() * 4)
+      except NotImplementedError:
+        pass
+
     p.add_option('--raw',
                  dest='raw', action='store_true',
                  help='Display raw diff.')
@@ -84,11 +234,28 @@ synced and their revisions won't be found.
                  dest='pretty_format', action='store',
                  metavar='<FORMAT>',
                  help='print the log using a custom git pretty format string')
+    p.add_option('-j', '--jobs',
+                 dest='jobs', action='store', type='int', default=jobs,
+                 help='number of projects to query simultaneously '
+                      '(default %d)' % jobs)
+
+  def _initRun(self):
+    """Reset the state kept for the length of a single run."""
+    self._quoted_revs = {}
+    self._log_cache = _LogCache(self.manifest)
+    self._commit_graphs = set()
+    self._commit_graph_lock = _threading.Lock()
 
   def _quote_rev(self, c):
-    if IsId(c):
-      c = c[:12]
-    return self._quote(c)
+    # Many projects share the same revision, only quote each one once.
+    quoted = self._quoted_revs.get(c)
+    if quoted is None:
+      if ID_RE.match(c):
+        quoted = self._quote(c[:12])
+      else:
+        quoted = self._quote(c)
+      self._quoted_revs[c] = quoted
+    return quoted
 
   def _quote(self, s):
     if self.output_markdown:
@@ -96,27 +263,198 @@ synced and their revisions won't be found.
     else:
       return s
 
-  def _printRawDiff(self, diff):
+  def _refreshCommitGraph(self, project):
+    """Bring the commit-graph of a changed project up to date.
+
+    The commit-graph lets `git log` walk history without parsing each commit
+    object.  Only object directories that already have one are refreshed:
+    writing a graph from scratch on a large project costs more than the walks
+    it would speed up.  Each object directory is handled at most once, and
+    only when its packs are newer than the graph.  Commits that were fetched
+    as loose objects are not noticed until the next repack; git simply parses
+    them directly in the meantime.
+
+    The graph is written from the gitdir, as the refs live there and not in
+    the objdir.  The commits already in the graph are kept, since other
+    checkouts of the project may share the objdir with different refs.
+    """
+    if not git_require((2, 24, 0)):
+      return
+    self._commit_graph_lock.acquire()
+    try:
+      if project.objdir in self._commit_graphs:
+        return
+      self._commit_graphs.add(project.objdir)
+    finally:
+      self._commit_graph_lock.release()
+
+    objects = os.path.join(project.objdir, 'objects')
+    info = os.path.join(objects, 'info')
+    graph_mtimes = []
+    for graph in (os.path.join(info, 'commit-graph'),
+                  os.path.join(info, 'commit-graphs', 'commit-graph-chain')):
+      try:
+        graph_mtimes.append(os.path.getmtime(graph))
+      except OSError:
+        pass
+    if not graph_mtimes:
+      return
+    try:
+      if max(graph_mtimes) >= os.path.getmtime(os.path.join(objects, 'pack')):
+        return
+    except OSError:
+      return
+
+    try:
+      project.bare_git.commit_graph('write', '--reachable', '--append',
+                                    '--no-progress')
+    except GitError:
+      # The graph is only an optimization, `git log` works without it.
+      pass
+
+  def _getLogs(self, project, otherProject, color=True, pretty_format=None):
+    """Stream the logs of a changed project, keeping only what gets printed.
+
+    Returns:
+      A dict mapping 'added' and 'removed' to a (total, lines) tuple, where
+      total counts all the non-empty log lines and lines holds the ones to
+      print: all of them, or only the first _LIMIT_LINES if there are more
+      than _MAX_LINES.
+    """
+    key = self._log_cache.Key(project, otherProject, color, pretty_format)
+    logs = self._log_cache.Get(key)
+    if logs is not None:
+      return logs
+
+    self._refreshCommitGraph(project)
+    # Both revisions have to be checked up front, `git log` does not report
+    # missing ones when run from the worktree.
+    try:
+      if pretty_format is None:
+        counts = project.countAddedAndRemovedLogs(otherProject)
+      else:
+        # A custom format may span several lines per commit, so the lines are
+        # counted as they are read instead of the commits.
+        project.verifyRevisions(otherProject)
+    except GitError:
+      # A revision is missing locally (e.g. an unfetched sha), so there are
+      # no logs to show.  Don't cache that, it may be fetched later.
+      return {'added': (0, []), 'removed': (0, [])}
+
+    totals = {'A': 0, 'R': 0}
+    lines = {'A': [], 'R': []}
+    max_count = None
+    if pretty_format is None:
+      # Each commit is logged on a single line, so the counts are the totals
+      # and git only needs to format the commits that get printed.
+      totals['A'], totals['R'] = counts
+      max_count = _MAX_LINES
+
+    stream = project.iterAddedAndRemovedLogs(
+        otherProject, oneline=(pretty_format is None), color=color,
+        pretty_format=pretty_format, config=_LOG_CONFIG, max_count=max_count)
+    for side, log in stream:
+      if log and not log.isspace():
+        if max_count is None:
+          totals[side] += 1
+        if len(lines[side]) < _MAX_LINES:
+          lines[side].append(log)
+    for side in ('A', 'R'):
+      if totals[side] > _MAX_LINES:
+        del lines[side][_LIMIT_LINES:]
+    logs = {'added': (totals['A'], lines['A']),
+            'removed': (totals['R'], lines['R'])}
+    self._log_cache.Set(key, logs)
+    return logs
+
+  def _LogsHelper(self, project, otherProject, logs_map, sem, color,
+                  pretty_format):
+    """Obtains the logs for a changed project.
+
+    It will release the semaphore when done.
+
+    Args:
+      project: Project as found in the first manifest.
+      otherProject: Same project as found in the second manifest.
+      logs_map: Dict to store the logs in, keyed by (project, otherProject).
+      sem: Semaphore, will call release() when complete.
+      color: Whether the logs should be colored.
+      pretty_format: Custom git pretty format string, if any.
+    """
+    try:
+      logs_map[(project, otherProject)] = self._getLogs(
+          project, otherProject, color=color, pretty_format=pretty_format)
+    except GitError:
+      # Leave it out of logs_map; the printing pass will retry and report it.
+      pass
+    finally:
+      sem.release()
+
+  def _collectLogs(self, diff, jobs, color=True, pretty_format=None):
+    """Fetch the logs of all changed projects, |jobs| projects at a time.
+
+    Projects whose logs could not be fetched are left out of the returned
+    dict, so that the printing pass fetches them again and reports any error.
+    With a single job nothing is prefetched.
+    """
+    logs_map = {}
+    if jobs <= 1:
+      return logs_map
+
+    sem = _threading.Semaphore(jobs)
+    threads = []
+    for project, otherProject in diff['changed']:
+      sem.acquire()
+      kwargs = dict(project=project,
+                    otherProject=otherProject,
+                    logs_map=logs_map,
+                    sem=sem,
+                    color=color,
+                    pretty_format=pretty_format)
+      t = _threading.Thread(target=self._LogsHelper, kwargs=kwargs)
+      # Ensure that Ctrl-C will not freeze the repo process.
+      t.daemon = True
+      threads.append(t)
+      t.start()
+    for t in threads:
+      t.join()
+    return logs_map
+
+  def _printRawDiff(self, diff, logs_map=None):
+    if logs_map is None:
+      logs_map = {}
+    # Raw output is meant to be parsed, write it out as is without coloring.
+    write = sys.stdout.write
+
     for project in diff['added']:
-      self.printText("A %s %s" % (project.relpath, project.revisionExpr))
-      self.out.nl()
+      write(' '.join(('A', project.relpath, project.revisionExpr)) + '\n')
 
     for project in diff['removed']:
-      self.printText("R %s %s" % (project.relpath, project.revisionExpr))
-      self.out.nl()
+      write(' '.join(('R', project.relpath, project.revisionExpr)) + '\n')
 
     for project, otherProject in diff['changed']:
-      self.printText("C %s %s %s" % (project.relpath, project.revisionExpr,
-                                     otherProject.revisionExpr))
-      self.out.nl()
-      self._printLogs(project, otherProject, raw=True, color=False)
+      write(' '.join(('C', project.relpath, project.revisionExpr,
+                      otherProject.revisionExpr)) + '\n')
+      logs = logs_map.get((project, otherProject))
+      if logs is None:
+        logs = self._getLogs(project, otherProject, color=False)
+      self._printLogs(logs['added'], logs['removed'], raw=True)
 
     for project, otherProject in diff['unreachable']:
-      self.printText("U %s %s %s" % (project.relpath, project.revisionExpr,
-                                     otherProject.revisionExpr))
-      self.out.nl()
-
-  def _printDiff(self, diff, color=True, pretty_format=None):
+      write(' '.join(('U', project.relpath, project.revisionExpr,
+                      otherProject.revisionExpr)) + '\n')
+
+    sys.stdout.flush()
+
+  def _printDiff(self, diff, color=True, pretty_format=None, logs_map=None):
+    if logs_map is None:
+      logs_map = {}
+    printText = self.printText
+    printProject = self.printProject
+    printRevision = self.printRevision
+    quote = self._quote
+    quote_rev = self._quote_rev
+    nl = self.out.nl
     if self.output_markdown:
       title_prefix = '### '
       list_prefix = '* '
@@ -124,127 +462,159 @@ synced and their revisions won't be found.
       title_prefix = ''
       list_prefix = '\t'
 
-    if diff['added']:
-      self.out.nl()
-      self.printText('%sadded projects :\n' % title_prefix)
-      self.out.nl()
-      for project in diff['added']:
-        self.printProject('%s%s' % (list_prefix, self._quote(project.relpath)))
-        self.printText(' at revision ')
-        self.printRevision(self._quote_rev(project.revisionExpr))
-        self.out.nl()
-
-    if diff['removed']:
-      self.out.nl()
-      self.printText('%sremoved projects :\n' % title_prefix)
-      self.out.nl()
-      for project in diff['removed']:
-        self.printProject('%s%s' % (list_prefix, self._quote(project.relpath)))
-        self.printText(' at revision ')
-        self.printRevision(self._quote_rev(project.revisionExpr))
-        self.out.nl()
-
-    if diff['changed']:
-      self.out.nl()
-      self.printText('%schanged projects :\n' % title_prefix)
-      self.out.nl()
-      for project, otherProject in diff['changed']:
-        logs = project.getAddedAndRemovedLogs(otherProject,
-                                              oneline=(pretty_format is None),
-                                              color=color,
-                                              pretty_format=pretty_format)
-        self.printProject('%s%s' % (list_prefix, self._quote(project.relpath)))
-        self.printText(' changed from ')
-        self.printRevision(self._quote_rev(project.revisionExpr))
-        self.printText(' to ')
-        self.printRevision(self._quote_rev(otherProject.revisionExpr))
-        added = removed = 0
-        if logs['added']:
-          added = len([x for x in logs['added'].split('\n') if x.strip()])
-        if logs['removed']:
-          removed = len([x for x in logs['removed'].split('\n') if x.strip()])
-        added=str(added)
-        removed=str(removed)
-        self.printText(' with %s adds, %s removes' % (self._quote(added),
-                                                      self._quote(removed)))
-        self.out.nl()
-        self._printLogs(project, otherProject, raw=False, color=color,
-                        pretty_format=pretty_format,
-                        logs=logs)
-        self.out.nl()
-
-    if diff['unreachable']:
-      self.out.nl()
-      self.printText('%sprojects with unreachable revisions :\n' % title_prefix)
-      self.out.nl()
-      for project, otherProject in diff['unreachable']:
-        self.printProject('%s%s ' % (list_prefix, self._quote(project.relpath)))
-        self.printRevision(self._quote_rev(project.revisionExpr))
-        self.printText(' or ')
-        self.printRevision(self._quote_rev(otherProject.revisionExpr))
-        self.printText(' not found')
-        self.out.nl()
-
-  def _printLogs(self, project, otherProject, raw=False, color=True,
-                 pretty_format=None, logs=None):
-    if not logs:
-      logs = project.getAddedAndRemovedLogs(otherProject,
-                                          oneline=(pretty_format is None),
-                                          color=color,
-                                          pretty_format=pretty_format)
+    def printAt(project):
+      printProject(list_prefix + quote(project.relpath))
+      printText(' at revision ')
+      printRevision(quote_rev(project.revisionExpr))
+      nl()
+
+    def printChanged(projects):
+      project, otherProject = projects
+      logs = logs_map.get(projects)
+      if logs is None:
+        logs = self._getLogs(project, otherProject, color=color,
+                             pretty_format=pretty_format)
+      printProject(list_prefix + quote(project.relpath))
+      printText(' changed from ')
+      printRevision(quote_rev(project.revisionExpr))
+      printText(' to ')
+      printRevision(quote_rev(otherProject.revisionExpr))
+      added = str(logs['added'][0])
+      removed = str(logs['removed'][0])
+      printText(' with %s adds, %s removes' % (quote(added), quote(removed)))
+      nl()
+      self._printLogs(logs['added'], logs['removed'])
+      nl()
+
+    def printUnreachable(projects):
+      project, otherProject = projects
+      printProject(list_prefix + quote(project.relpath) + ' ')
+      printRevision(quote_rev(project.revisionExpr))
+      printText(' or ')
+      printRevision(quote_rev(otherProject.revisionExpr))
+      printText(' not found')
+      nl()
+
+    for section, title, printItem in (
+        ('added', 'added projects :', printAt),
+        ('removed', 'removed projects :', printAt),
+        ('changed', 'changed projects :', printChanged),
+        ('unreachable', 'projects with unreachable revisions :',
+         printUnreachable)):
+      if diff[section]:
+        nl()
+        printText('%s%s\n' % (title_prefix, title))
+        nl()
+        for item in diff[section]:
+          printItem(item)
+
+  def _printLogs(self, added, removed, raw=False):
+    """Print the logs of a changed project.
+
+    Args:
+      added: (total, lines) tuple of the added logs, as returned by _getLogs.
+      removed: (total, lines) tuple of the removed logs.
+      raw: Whether to print the logs in the raw format.
+    """
+    if raw:
+      write = sys.stdout.write
+      printText = printAdded = printRemoved = write
+
+      def nl():
+        write('\n')
+    else:
+      printText = self.printText
+      printAdded = self.printAdded
+      printRemoved = self.printRemoved
+      nl = self.out.nl
     if self.output_markdown:
       sublist_prefix = '    - '
     else:
       sublist_prefix = '\t\t'
-    limit_lines = 10
-    if logs['removed']:
-      removedLogs = logs['removed'].split('\n')
-      count=0
-      for log in removedLogs:
-        count += 1
-        if log.strip():
-          if raw:
-            self.printText(' R ' + log)
-            self.out.nl()
-          else:
-            self.printRemoved('%s[-] ' % sublist_prefix)
-            self.printText(log)
-            self.out.nl()
-          if len(removedLogs) > limit_lines * 3 / 2 \
-             and count >= limit_lines:
-            self.printRemoved('%s... ' % sublist_prefix)
-            self.printText("(TOTAL %d REMOVED LOGS)" % len(removedLogs))
-            self.out.nl()
-            break
-
-    if logs['added']:
-      addedLogs = logs['added'].split('\n')
-      count=0
-      for log in addedLogs:
-        count += 1
-        if log.strip():
-          if raw:
-            self.printText(' A ' + log)
-            self.out.nl()
-          else:
-            self.printAdded('%s[+] ' % sublist_prefix)
-            self.printText(log)
-            self.out.nl()
-          if len(addedLogs) > limit_lines * 3 / 2 \
-             and count >= limit_lines:
-            self.printAdded('%s... ' % sublist_prefix)
-            self.printText("(TOTAL %d ADDED LOGS)" % len(addedLogs))
-            self.out.nl()
-            break
+    removed_prefix = sublist_prefix + '[-] '
+    added_prefix = sublist_prefix + '[+] '
+    more_prefix = sublist_prefix + '... '
+
+    total, removedLogs = removed
+    for log in removedLogs:
+      if raw:
+        printText(_RAW_REMOVED + log)
+        nl()
+      else:
+        printRemoved(removed_prefix)
+        printText(log)
+        nl()
+    if total > _MAX_LINES:
+      printRemoved(more_prefix)
+      printText("(TOTAL %d REMOVED LOGS)" % total)
+      nl()
+
+    total, addedLogs = added
+    for log in addedLogs:
+      if raw:
+        printText(_RAW_ADDED + log)
+        nl()
+      else:
+        printAdded(added_prefix)
+        printText(log)
+        nl()
+    if total > _MAX_LINES:
+      printAdded(more_prefix)
+      printText("(TOTAL %d ADDED LOGS)" % total)
+      nl()
+
+  def _saveWorktreeManifest(self, path):
+    """Save the current manifest, pegged to the worktree revisions, to |path|.
+
+    The file is left untouched if it already has the same content.
+    """
+    buf = StringIO()
+    self.manifest.Save(buf, peg_rev=True, peg_rev_upstream=False)
+    data = buf.getvalue()
+
+    try:
+      with open(path) as fd:
+        if fd.read() == data:
+          return
+    except IOError:
+      pass
+
+    try:
+      os.makedirs(self.manifest.altManifestDir)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+    # Write to a temporary file first so a partial manifest never gets
+    # picked up by a later run.  Each run gets its own, as several may run at
+    # the same time.
+    fd, tmp = tempfile.mkstemp(dir=self.manifest.altManifestDir,
+                               prefix=os.path.basename(path) + '.')
+    try:
+      with os.fdopen(fd, 'w') as f:
+        f.write(data)
+      platform_utils.rename(tmp, path)
+      tmp = None
+    finally:
+      if tmp is not None:
+        platform_utils.remove(tmp)
+
+  def _loadManifest(self, name, load_local_manifests):
+    """Load manifest |name|, reusing the already parsed manifest for '-'."""
+    if name == '-':
+      return self.manifest
+    manifest = XmlManifest(self.manifest.repodir)
+    manifest.Override(name, load_local_manifests=load_local_manifests)
+    return manifest
 
   def Execute(self, opt, args):
     if len(args) > 2:
       self.Usage()
 
     self.output_markdown = opt.markdown
+    self._initRun()
     self.out = _Coloring(self.manifest.globalConfig)
     self.printText = self.out.nofmt_printer('text')
-    if opt.color:
+    if opt.color and self.out.is_on:
       self.printProject = self.out.nofmt_printer('project', attr = 'bold')
       self.printAdded = self.out.nofmt_printer('green', fg = 'green', attr = 'bold')
       self.printRemoved = self.out.nofmt_printer('red', fg = 'red', attr = 'bold')
@@ -252,31 +622,20 @@ synced and their revisions won't be found.
     else:
       self.printProject = self.printAdded = self.printRemoved = self.printRevision = self.printText
 
-    manifest1 = XmlManifest(self.manifest.repodir)
     if not args:
       # if no args specified, export one manifest for comparison
       manifest1_name = '-'
       manifest2_name = ':__worktree.xml'
-      if not os.path.exists(self.manifest.altManifestDir):
-        os.mkdir(self.manifest.altManifestDir)
-      path = os.path.join(self.manifest.altManifestDir, manifest2_name[1:])
-      fd = open(path, 'w')
-      self.manifest.Save(fd, peg_rev=True, peg_rev_upstream=False)
-      fd.close()
-      manifest2 = XmlManifest(self.manifest.repodir)
-      manifest2.Override(manifest2_name, load_local_manifests=opt.load_local_manifests)
+      self._saveWorktreeManifest(
+          os.path.join(self.manifest.altManifestDir, manifest2_name[1:]))
     else:
       manifest1_name = args[0]
-      if manifest1_name != '-':
-        manifest1.Override(manifest1_name, load_local_manifests=opt.load_local_manifests)
       if len(args) == 1:
-        manifest2 = self.manifest
         manifest2_name = '-'
       else:
         manifest2_name = args[1]
-        manifest2 = XmlManifest(self.manifest.repodir)
-        if manifest2_name != '-':
-          manifest2.Override(manifest2_name, load_local_manifests=opt.load_local_manifests)
+    manifest1 = self._loadManifest(manifest1_name, opt.load_local_manifests)
+    manifest2 = self._loadManifest(manifest2_name, opt.load_local_manifests)
 
     if manifest1_name == '-':
       manifest1_name = MANIFEST_FILE_NAME
@@ -285,10 +644,15 @@ synced and their revisions won't be found.
 
     diff = manifest1.projectsDiff(manifest2)
     if opt.raw:
-      self._printRawDiff(diff)
+      logs_map = self._collectLogs(diff, opt.jobs, color=False)
+      self._printRawDiff(diff, logs_map=logs_map)
     else:
+      logs_map = self._collectLogs(diff, opt.jobs, color=opt.color,
+                                   pretty_format=opt.pretty_format)
       if self.output_markdown and (diff['added'] or diff['removed'] \
                            or diff['changed'] or diff['unreachable']):
         self.printText("## repo diffmanifests %s %s" % (manifest1_name, manifest2_name))
         self.out.nl()
-      self._printDiff(diff, color=opt.color, pretty_format=opt.pretty_format)
+      self._printDiff(diff, color=opt.color, pretty_format=opt.pretty_format,
+                      logs_map=logs_map)
+    self._log_cache.Save()
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the manifest_xml.py module."""
+
+from __future__ import print_function
+
+import unittest
+
+from error import ManifestInvalidRevisionError
+import manifest_xml
+
+
+class FakeProject(object):
+  """A project at a revision, which might not be found."""
+
+  def __init__(self, path, revision):
+    self.path = path
+    self.revision = revision
+
+  def GetCommitRevisionId(self):
+    if self.revision is None:
+      raise ManifestInvalidRevisionError('revision not found')
+    return self.revision
+
+
+def _Manifest(*projects):
+  """Create a manifest which has already loaded |projects|."""
+  manifest = manifest_xml.XmlManifest.__new__(manifest_xml.XmlManifest)
+  manifest._loaded = True
+  manifest._paths = dict((p.path, p) for p in projects)
+  return manifest
+
+
+class ProjectsDiff(unittest.TestCase):
+  """Check the projects differences between two manifests."""
+
+  def test_empty(self):
+    """Identical manifests have no differences."""
+    manifest = _Manifest(FakeProject('a', '1'))
+    self.assertEqual(manifest.projectsDiff(_Manifest(FakeProject('a', '1'))),
+                     {'added': [], 'removed': [], 'changed': [],
+                      'unreachable': []})
+
+  def test_buckets(self):
+    """Projects are put in the right bucket, sorted by path."""
+    from_projects = {
+        'same': FakeProject('same', '1'),
+        'z/changed': FakeProject('z/changed', '1'),
+        'b/changed': FakeProject('b/changed', '1'),
+        'z/removed': FakeProject('z/removed', '1'),
+        'a/removed': FakeProject('a/removed', '1'),
+        'lost': FakeProject('lost', None),
+    }
+    to_projects = {
+        'same': FakeProject('same', '1'),
+        'z/changed': FakeProject('z/changed', '2'),
+        'b/changed': FakeProject('b/changed', '2'),
+        'y/added': FakeProject('y/added', '1'),
+        'c/added': FakeProject('c/added', '1'),
+        'lost': FakeProject('lost', '1'),
+    }
+    diff = _Manifest(*from_projects.values()).projectsDiff(
+        _Manifest(*to_projects.values()))
+
+    self.assertEqual(diff['added'],
+                     [to_projects['c/added'], to_projects['y/added']])
+    self.assertEqual(diff['removed'],
+                     [from_projects['a/removed'], from_projects['z/removed']])
+    self.assertEqual(diff['changed'],
+                     [(from_projects['b/changed'], to_projects['b/changed']),
+                      (from_projects['z/changed'], to_projects['z/changed'])])
+    self.assertEqual(diff['unreachable'],
+                     [(from_projects['lost'], to_projects['lost'])])
@@ -18,8 +18,14 @@
 
 from __future__ import print_function
 
+import os
+import shutil
+import subprocess
+import tempfile
 import unittest
 
+import error
+import git_config
 import project
 
 
@@ -60,3 +66,105 @@ class RepoHookShebang(unittest.TestCase):
     for shebang, interp in DATA:
       self.assertEqual(project.RepoHook._ExtractInterpFromShebang(shebang),
                        interp)
+
+
+class FakeManifest(object):
+  """Just enough of a manifest to create projects."""
+
+  def __init__(self, tempdir):
+    self.globalConfig = git_config.GitConfig(os.path.join(tempdir, 'gitconfig'))
+
+
+class ProjectLogs(unittest.TestCase):
+  """Check reading the logs between two revisions of a project."""
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp(prefix='repo_tests')
+    self.worktree = os.path.join(self.tempdir, 'proj')
+    self.gitdir = os.path.join(self.worktree, '.git')
+    self._git('init', '-q', self.worktree, cwd=self.tempdir)
+    self._commit('base')
+    self._git('checkout', '-q', '-b', 'old')
+    self._commit('r1')
+    self.old = self._git('rev-parse', 'HEAD')
+    self._git('checkout', '-q', '-b', 'new', 'HEAD~1')
+    for subject in ('a1', 'a2', 'a3'):
+      self._commit(subject)
+    self.new = self._git('rev-parse', 'HEAD')
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def _git(self, *args, **kwargs):
+    """Run git in the test worktree and return its stripped output."""
+    cwd = kwargs.get('cwd', self.worktree)
+    out = subprocess.check_output(['git'] + list(args), cwd=cwd)
+    return out.decode('utf-8').strip()
+
+  def _commit(self, subject):
+    self._git('-c', 'user.name=Repo Test', '-c', 'user.email=repo@example.com',
+              'commit', '-q', '--allow-empty', '-m', subject)
+
+  def _project(self, revision, worktree=None):
+    return project.Project(manifest=FakeManifest(self.tempdir),
+                           name='proj',
+                           remote=None,
+                           gitdir=self.gitdir,
+                           objdir=self.gitdir,
+                           worktree=worktree or self.worktree,
+                           relpath='proj',
+                           revisionExpr=revision,
+                           revisionId=None)
+
+  def _logs(self, fromProject, toProject, **kwargs):
+    """Return the logs as (side, subject) tuples, dropping the commit ids."""
+    return [(side, log.split(' ', 1)[1])
+            for side, log in fromProject.iterAddedAndRemovedLogs(
+                toProject, oneline=True, color=False, **kwargs)]
+
+  def test_iter_logs(self):
+    """Removed logs come first, then added logs, newest first."""
+    self.assertEqual(
+        self._logs(self._project(self.old), self._project(self.new)),
+        [('R', 'r1'), ('A', 'a3'), ('A', 'a2'), ('A', 'a1')])
+
+  def test_iter_logs_without_worktree(self):
+    """The logs are read from the gitdir when the worktree is missing."""
+    missing = os.path.join(self.tempdir, 'missing')
+    self.assertEqual(
+        self._logs(self._project(self.old, worktree=missing),
+                   self._project(self.new, worktree=missing)),
+        [('R', 'r1'), ('A', 'a3'), ('A', 'a2'), ('A', 'a1')])
+
+  def test_iter_logs_max_count(self):
+    """max_count caps the logs read on each side."""
+    self.assertEqual(
+        self._logs(self._project(self.old), self._project(self.new),
+                   max_count=1),
+        [('R', 'r1'), ('A', 'a3')])
+
+  def test_count_logs(self):
+    """The left side of the range is removed, the right side is added."""
+    old, new = self._project(self.old), self._project(self.new)
+    self.assertEqual(old.countAddedAndRemovedLogs(new), (3, 1))
+    self.assertEqual(new.countAddedAndRemovedLogs(old), (1, 3))
+
+  def test_count_logs_unknown_revision(self):
+    """Counting fails when a revision is not available locally."""
+    missing = self._project('deadbeef' * 5)
+    with self.assertRaises(error.GitError):
+      self._project(self.old).countAddedAndRemovedLogs(missing)
+
+  def test_verify_revisions(self):
+    """Only revisions available locally pass verification."""
+    old, new = self._project(self.old), self._project(self.new)
+    old.verifyRevisions(new)
+    with self.assertRaises(error.GitError):
+      old.verifyRevisions(self._project('deadbeef' * 5))
+
+  def test_iter_logs_no_decorate(self):
+    """Ref names are left out of the logs even if log.decorate is set."""
+    self._git('config', 'log.decorate', 'short')
+    self.assertEqual(
+        self._logs(self._project(self.old), self._project(self.new)),
+        [('R', 'r1'), ('A', 'a3'), ('A', 'a2'), ('A', 'a1')])
@@ -0,0 +1,365 @@
+# -*- coding:utf-8 -*-
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unittests for the subcmds/diffmanifests.py module."""
+
+from __future__ import print_function
+
+import binascii
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from error import GitError
+import git_config
+import project
+from subcmds import diffmanifests
+
+
+class FakeManifest(object):
+  """Just enough of a manifest to hold the log cache and create projects."""
+
+  def __init__(self, repodir):
+    self.repodir = repodir
+    self.globalConfig = git_config.GitConfig(os.path.join(repodir, 'gitconfig'))
+
+
+class FakeOutput(object):
+  """Collects everything the command prints."""
+
+  def __init__(self):
+    self.text = []
+
+  def write(self, s):
+    self.text.append(s)
+
+  def nl(self):
+    self.text.append('\n')
+
+  def getvalue(self):
+    return ''.join(self.text)
+
+
+def _Command(tempdir):
+  """Create a command ready for a run, which prints to a FakeOutput."""
+  cmd = diffmanifests.Diffmanifests()
+  cmd.manifest = FakeManifest(tempdir)
+  cmd.output_markdown = False
+  cmd.out = FakeOutput()
+  cmd.printText = cmd.printProject = cmd.out.write
+  cmd.printAdded = cmd.printRemoved = cmd.printRevision = cmd.out.write
+  cmd._initRun()
+  return cmd
+
+
+class WorktreeManifest(object):
+  """A manifest which saves some fixed content."""
+
+  def __init__(self, altManifestDir):
+    self.altManifestDir = altManifestDir
+
+  def Save(self, fd, peg_rev=False, peg_rev_upstream=True):
+    fd.write('<manifest/>\n')
+
+
+class UnfetchedProject(object):
+  """A project pinned to a sha that is not available locally."""
+
+  def __init__(self, revision):
+    self.relpath = 'proj'
+    self.gitdir = '/nonexistent/proj.git'
+    self.objdir = self.gitdir
+    self.revisionExpr = revision
+
+  def GetCommitRevisionId(self):
+    return self.revisionExpr
+
+  def countAddedAndRemovedLogs(self, toProject):
+    raise GitError('proj rev-list: Invalid symmetric difference expression')
+
+  def verifyRevisions(self, toProject):
+    raise GitError('proj rev-list: bad object')
+
+  def iterAddedAndRemovedLogs(self, toProject, **kwargs):
+    raise GitError('proj log: bad revision')
+
+
+class UnfetchedRevision(unittest.TestCase):
+  """Check diffs of projects whose revisions cannot be found."""
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp(prefix='repo_tests')
+    self.cmd = _Command(self.tempdir)
+    self.old = UnfetchedProject('a' * 40)
+    self.new = UnfetchedProject('b' * 40)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def test_print_diff(self):
+    """A project whose logs cannot be counted has no adds nor removes."""
+    diff = {'added': [], 'removed': [], 'unreachable': [],
+            'changed': [(self.old, self.new)]}
+    logs_map = self.cmd._collectLogs(diff, 2, color=False)
+    self.cmd._printDiff(diff, color=False, logs_map=logs_map)
+    self.assertIn('\tproj changed from aaaaaaaaaaaa to bbbbbbbbbbbb'
+                  ' with 0 adds, 0 removes\n', self.cmd.out.getvalue())
+
+  def test_not_cached(self):
+    """The logs are looked up again once the revision has been fetched."""
+    self.cmd._getLogs(self.old, self.new, color=False)
+    key = self.cmd._log_cache.Key(self.old, self.new, False, None)
+    self.assertIsNone(self.cmd._log_cache.Get(key))
+    self.cmd._log_cache.Save()
+    self.assertFalse(os.path.exists(
+        os.path.join(self.tempdir, '.repo_diffmanifests.json')))
+
+  def test_not_cached_pretty_format(self):
+    """Custom formats are not cached either when a revision is missing."""
+    self.cmd._getLogs(self.old, self.new, color=False, pretty_format='%s')
+    key = self.cmd._log_cache.Key(self.old, self.new, False, '%s')
+    self.assertIsNone(self.cmd._log_cache.Get(key))
+
+
+class GitTestCase(unittest.TestCase):
+  """Base class for tests against a real git repository."""
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp(prefix='repo_tests')
+    self.worktree = os.path.join(self.tempdir, 'proj')
+    self.gitdir = os.path.join(self.worktree, '.git')
+    self._git('init', '-q', self.worktree, cwd=self.tempdir)
+    self._commit('base')
+    self.base = self._git('rev-parse', 'HEAD')
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def _git(self, *args, **kwargs):
+    """Run git in the test worktree and return its stripped output."""
+    cwd = kwargs.get('cwd', self.worktree)
+    out = subprocess.check_output(['git'] + list(args), cwd=cwd)
+    return out.decode('utf-8').strip()
+
+  def _commit(self, subject):
+    self._git('-c', 'user.name=Repo Test', '-c', 'user.email=repo@example.com',
+              'commit', '-q', '--allow-empty', '-m', subject)
+
+  def _project(self, revision, objdir=None):
+    return project.Project(manifest=FakeManifest(self.tempdir),
+                           name='proj',
+                           remote=None,
+                           gitdir=self.gitdir,
+                           objdir=objdir or self.gitdir,
+                           worktree=self.worktree,
+                           relpath='proj',
+                           revisionExpr=revision,
+                           revisionId=None)
+
+
+class LogTruncation(GitTestCase):
+  """Check how many logs get printed for a changed project."""
+
+  def _printAdded(self, count, pretty_format=None):
+    """Print the diff of a project which gained |count| commits."""
+    self._git('checkout', '-q', '-B', 'side', self.base)
+    for i in range(count):
+      self._commit('added %d' % i)
+    cmd = _Command(self.tempdir)
+    diff = {'added': [], 'removed': [], 'unreachable': [],
+            'changed': [(self._project(self.base),
+                         self._project(self._git('rev-parse', 'HEAD')))]}
+    cmd._printDiff(diff, color=False, pretty_format=pretty_format)
+    return cmd.out.getvalue()
+
+  def test_all_logs(self):
+    """Up to _MAX_LINES logs are all printed."""
+    out = self._printAdded(15)
+    self.assertIn(' with 15 adds, 0 removes\n', out)
+    self.assertEqual(out.count('\t\t[+] '), 15)
+    self.assertIn('[+] ', out.splitlines()[-2])
+    self.assertNotIn('TOTAL', out)
+
+  def test_truncated_logs(self):
+    """Past _MAX_LINES logs, only _LIMIT_LINES are printed with the total."""
+    out = self._printAdded(16)
+    self.assertIn(' with 16 adds, 0 removes\n', out)
+    self.assertEqual(out.count('\t\t[+] '), 10)
+    self.assertIn('\t\t... (TOTAL 16 ADDED LOGS)\n', out)
+    self.assertIn('added 15\n', out)
+    self.assertNotIn('added 5\n', out)
+
+  def test_truncated_pretty_format(self):
+    """Custom formats are truncated the same way."""
+    out = self._printAdded(16, pretty_format='%s')
+    self.assertIn(' with 16 adds, 0 removes\n', out)
+    self.assertEqual(out.count('\t\t[+] '), 10)
+    self.assertIn('\t\t... (TOTAL 16 ADDED LOGS)\n', out)
+
+
+class LogCache(unittest.TestCase):
+  """Check loading the log cache."""
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp(prefix='repo_tests')
+    self.manifest = FakeManifest(self.tempdir)
+    self.path = os.path.join(self.tempdir, '.repo_diffmanifests.json')
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def _load(self, logs):
+    with open(self.path, 'w') as fd:
+      json.dump(logs, fd)
+    return diffmanifests._LogCache(self.manifest)
+
+  def test_valid(self):
+    """Recent entries are kept."""
+    logs = {'added': (2, ['a1', 'a2']), 'removed': (0, [])}
+    cache = self._load({'k': dict(logs, time=time.time())})
+    self.assertEqual(cache.Get('k'),
+                     {'added': [2, ['a1', 'a2']], 'removed': [0, []]})
+
+  def test_expired(self):
+    """Entries older than a week are dropped."""
+    cache = self._load({'k': {'added': [0, []], 'removed': [0, []],
+                              'time': time.time() - 8 * 24 * 60 * 60}})
+    self.assertIsNone(cache.Get('k'))
+
+  def test_volatile_formats(self):
+    """Formats showing details that change over time are not cached."""
+    old, new = UnfetchedProject('a' * 40), UnfetchedProject('b' * 40)
+    cache = diffmanifests._LogCache(self.manifest)
+    for pretty_format in ('%h %ar', '%cr', '%ad', '%ch', '%d', '%s%D',
+                          '%G?', '%(describe)', '%%%ar'):
+      self.assertIsNone(cache.Key(old, new, False, pretty_format))
+    for pretty_format in (None, '%h %s', '%an', '%H%n%b', '%%ar', '%%d'):
+      self.assertIsNotNone(cache.Key(old, new, False, pretty_format))
+
+  def test_malformed(self):
+    """A malformed cache is discarded."""
+    now = time.time()
+    for logs in ([], {'k': None}, {'k': {'time': now}},
+                 {'k': {'added': 1, 'removed': [0, []], 'time': now}},
+                 {'k': {'added': [0, []], 'removed': [0, []], 'time': 'x'}}):
+      cache = self._load(logs)
+      self.assertIsNone(cache.Get('k'))
+      cache.Set('k', {'added': (0, []), 'removed': (0, [])})
+      cache.Save()
+
+
+class RefreshCommitGraph(GitTestCase):
+  """Check when the commit-graph of a project gets written."""
+
+  def setUp(self):
+    super(RefreshCommitGraph, self).setUp()
+    # Split the objects out of the gitdir like repo does, without the refs.
+    self.objdir = os.path.join(self.tempdir, 'proj-objects.git')
+    self._git('init', '-q', '--bare', self.objdir, cwd=self.tempdir)
+    shutil.rmtree(os.path.join(self.objdir, 'objects'))
+    os.rename(os.path.join(self.gitdir, 'objects'),
+              os.path.join(self.objdir, 'objects'))
+    os.symlink(os.path.join(self.objdir, 'objects'),
+               os.path.join(self.gitdir, 'objects'))
+    self.graph = os.path.join(self.objdir, 'objects', 'info', 'commit-graph')
+    self.cmd = _Command(self.tempdir)
+
+  def _refresh(self):
+    self.cmd._refreshCommitGraph(self._project('HEAD', objdir=self.objdir))
+
+  def _writeStaleGraph(self):
+    """Write a graph, then add a commit to a pack that is newer."""
+    self._git('commit-graph', 'write', '--reachable')
+    os.utime(self.graph, (1000, 1000))
+    self._commit('new')
+    self._git('repack', '-q')
+    return self._git('rev-parse', 'HEAD')
+
+  def _inGraph(self, commit):
+    with open(self.graph, 'rb') as fd:
+      return binascii.unhexlify(commit) in fd.read()
+
+  def test_no_graph(self):
+    """A missing graph is not written from scratch."""
+    self._refresh()
+    self.assertFalse(os.path.exists(self.graph))
+
+  def test_up_to_date(self):
+    """A graph newer than the packs is left alone."""
+    self._git('repack', '-q')
+    self._git('commit-graph', 'write', '--reachable')
+    os.utime(self.graph, (4000000000, 4000000000))
+    self._refresh()
+    self.assertEqual(os.path.getmtime(self.graph), 4000000000)
+
+  def test_stale(self):
+    """A stale graph gets the new commits of the gitdir refs."""
+    new = self._writeStaleGraph()
+    self._refresh()
+    self.assertTrue(self._inGraph(new))
+
+  def test_stale_keeps_commits(self):
+    """Commits of other checkouts sharing the objdir stay in the graph."""
+    self._git('checkout', '-q', '-b', 'other')
+    self._commit('other')
+    other = self._git('rev-parse', 'HEAD')
+    self._git('checkout', '-q', '-')
+    new = self._writeStaleGraph()
+    self._git('branch', '-q', '-D', 'other')
+    self._refresh()
+    self.assertTrue(self._inGraph(new))
+    self.assertTrue(self._inGraph(other))
+
+  def test_once_per_objdir(self):
+    """Each object directory is refreshed at most once per run."""
+    self._writeStaleGraph()
+    self._refresh()
+    os.utime(self.graph, (1000, 1000))
+    self._refresh()
+    self.assertEqual(os.path.getmtime(self.graph), 1000)
+
+
+class SaveWorktreeManifest(unittest.TestCase):
+  """Check saving the manifest of the worktree."""
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp(prefix='repo_tests')
+    self.altdir = os.path.join(self.tempdir, 'alt')
+    self.path = os.path.join(self.altdir, '__worktree.xml')
+    self.cmd = diffmanifests.Diffmanifests()
+    self.cmd.manifest = WorktreeManifest(self.altdir)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def test_save(self):
+    """The manifest is saved without leaving temporary files behind."""
+    self.cmd._saveWorktreeManifest(self.path)
+    self.cmd._saveWorktreeManifest(self.path)
+    with open(self.path) as fd:
+      self.assertEqual(fd.read(), '<manifest/>\n')
+    self.assertEqual(os.listdir(self.altdir), ['__worktree.xml'])
+
+  def test_save_failed(self):
+    """The temporary file is removed if the manifest cannot be replaced."""
+    os.makedirs(os.path.join(self.path, 'busy'))
+    with self.assertRaises(OSError):
+      self.cmd._saveWorktreeManifest(self.path)
+    self.assertEqual(os.listdir(self.altdir), ['__worktree.xml'])